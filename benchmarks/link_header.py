@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Compares the cost of building a MementoDetailView Link header by
+reversing each URL pattern against MementoDetailView.get_link_header,
+which uses the cached LinkHeaderBuilder.
+
+    $ python benchmarks/link_header.py
+"""
+import os
+import sys
+import timeit
+import urllib
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+settings.configure(
+    ROOT_URLCONF=__name__,
+    ALLOWED_HOSTS=['testserver'],
+    INSTALLED_APPS=('memento',),
+)
+import django
+django.setup()
+
+from django.conf.urls import url
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.core.urlresolvers import reverse
+from django.contrib.syndication.views import add_domain
+from django.contrib.sites.shortcuts import get_current_site
+from memento.timegate import MementoDetailView
+
+urlpatterns = [
+    url(r'^timegate/(?P<url>.*)$', HttpResponse, name='timegate'),
+    url(r'^timemap/link/(?P<url>.*)$', HttpResponse, name='timemap'),
+]
+
+ORIGINAL_URL = 'http://example.com/some/page/?q=1'
+NUMBER = 20000
+
+
+def reverse_absolute(request, pattern_name, url):
+    path = reverse(pattern_name, kwargs={'url': url})
+    current_site = get_current_site(request)
+    return add_domain(current_site.domain, path, request.is_secure())
+
+
+def reversed_header(request):
+    timemap_url = reverse_absolute(request, 'timemap', ORIGINAL_URL)
+    timegate_url = reverse_absolute(request, 'timegate', ORIGINAL_URL)
+    return """<%(original_url)s>; rel="original", \
+<%(timemap_url)s>; rel="timemap"; type="application/link-format", \
+<%(timegate_url)s>; rel="timegate\"""" % dict(
+        original_url=urllib.unquote(ORIGINAL_URL),
+        timemap_url=urllib.unquote(timemap_url),
+        timegate_url=urllib.unquote(timegate_url),
+    )
+
+
+class ExampleMementoDetailView(MementoDetailView):
+    timemap_pattern_name = 'timemap'
+    timegate_pattern_name = 'timegate'
+
+
+def view_header(request):
+    # The view is created for each request, as as_view() does
+    view = ExampleMementoDetailView(request=request)
+    return view.get_link_header(request, ORIGINAL_URL)
+
+
+def main():
+    request = RequestFactory().get('/')
+    assert reversed_header(request) == view_header(request)
+    for func in (reversed_header, view_header):
+        seconds = min(timeit.repeat(
+            lambda: func(request),
+            repeat=3,
+            number=NUMBER
+        ))
+        print("%-16s %6.1f us per request" % (
+            func.__name__,
+            seconds / NUMBER * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
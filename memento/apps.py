@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.core.checks import register, Tags
+
+
+class MementoConfig(AppConfig):
+    name = 'memento'
+    verbose_name = 'Memento'
+
+    def ready(self):
+        from .checks import check_timegate_indexes
+        register(check_timegate_indexes, Tags.models)
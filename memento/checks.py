@@ -0,0 +1,126 @@
+from django.core import checks
+from django.core.urlresolvers import get_resolver
+from django.db.models.constants import LOOKUP_SEP
+from django.core.exceptions import FieldDoesNotExist
+from .timegate import TimeGateView
+
+
+def get_timegate_views():
+    """
+    Returns every configured TimeGateView subclass that has been imported.
+    """
+    # Views are usually only imported by the URLconf, so load it first.
+    # Broken URLconfs are reported by Django's own checks.
+    try:
+        get_resolver().url_patterns
+    except Exception:
+        pass
+    seen = set()
+    stack = list(TimeGateView.__subclasses__())
+    while stack:
+        cls = stack.pop()
+        if cls in seen:
+            continue
+        seen.add(cls)
+        stack.extend(cls.__subclasses__())
+    return sorted(seen, key=lambda cls: (cls.__module__, cls.__name__))
+
+
+def get_view_model(view):
+    """
+    Returns the model a TimeGateView queries, or None if it has none.
+    """
+    if view.queryset is not None:
+        return view.queryset.model
+    return view.model
+
+
+def get_indexed_field_lists(opts):
+    """
+    Returns the field names of every multi-column index on a model.
+    """
+    field_lists = [list(fields) for fields in opts.index_together]
+    field_lists.extend(list(fields) for fields in opts.unique_together)
+    for index in getattr(opts, 'indexes', []):
+        field_lists.append([f.lstrip('-') for f in index.fields])
+    return field_lists
+
+
+def has_memento_index(model, url_field, datetime_field):
+    """
+    Returns True if the model has an index that leads with the local
+    column of url_field followed by datetime_field.
+    """
+    url_name = url_field.split(LOOKUP_SEP)[0]
+    wanted = [url_name, datetime_field]
+    for fields in get_indexed_field_lists(model._meta):
+        if fields[:2] == wanted:
+            return True
+    return False
+
+
+def check_view_index(view):
+    """
+    Checks a single TimeGateView for a usable composite index.
+    """
+    model = get_view_model(view)
+    if model is None or model._meta.abstract:
+        return []
+    opts = model._meta
+    label = '%s.%s' % (view.__module__, view.__name__)
+    model_label = '%s.%s' % (opts.app_label, opts.object_name)
+    url_name = view.url_field.split(LOOKUP_SEP)[0]
+    errors = []
+    for attr in ('url_field', 'datetime_field'):
+        name = getattr(view, attr).split(LOOKUP_SEP)[0]
+        try:
+            opts.get_field(name)
+        except FieldDoesNotExist:
+            errors.append(checks.Error(
+                "%s.%s refers to '%s', which is not a field of %s." % (
+                    label, attr, name, model_label
+                ),
+                obj=model,
+                id='memento.E001',
+            ))
+    if errors:
+        return errors
+    if not has_memento_index(model, view.url_field, view.datetime_field):
+        errors.append(checks.Warning(
+            "%s has no index over (%s, %s) for %s. Every TimeGate lookup "
+            "will scan the table." % (
+                model_label,
+                url_name,
+                view.datetime_field,
+                label,
+            ),
+            hint=(
+                "Subclass memento.models.MementoModel or add "
+                "('%s', '%s') to Meta.index_together." % (
+                    url_name,
+                    view.datetime_field,
+                )
+            ),
+            obj=model,
+            id='memento.W001',
+        ))
+    return errors
+
+
+def check_timegate_indexes(app_configs=None, **kwargs):
+    """
+    Warns about TimeGateView models missing a (url, datetime) index.
+    """
+    errors = []
+    checked = set()
+    for view in get_timegate_views():
+        model = get_view_model(view)
+        key = (model, view.url_field, view.datetime_field)
+        if key in checked:
+            continue
+        checked.add(key)
+        if app_configs is not None and model is not None:
+            if model._meta.app_config not in app_configs:
+                continue
+        errors.extend(check_view_index(view))
+    return errors
@@ -0,0 +1,155 @@
+import re
+import threading
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.timezone import (
+    utc,
+    is_naive,
+    make_aware,
+    make_naive,
+    get_default_timezone
+)
+from dateutil.parser import parse as dateparser
+
+RFC1123_RE = re.compile(
+    r'^(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun), (\d{1,2}) '
+    r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) '
+    r'(\d{4}) (\d{2}):(\d{2}):(\d{2}) GMT$'
+)
+MONTHS = dict(
+    (name, i + 1) for i, name in enumerate((
+        'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec',
+    ))
+)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
+# The number of recent Accept-Datetime headers kept parsed in memory
+ACCEPT_DATETIME_CACHE_SIZE = 1024
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping that keeps only the most recently used keys.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+accept_datetime_cache = LRUCache(ACCEPT_DATETIME_CACHE_SIZE)
+_missing = object()
+
+
+def to_utc(dt):
+    """
+    Returns the datetime as an aware UTC datetime. Naive values are
+    assumed to be in the default time zone, which is how Django stores
+    them when USE_TZ is False.
+    """
+    if is_naive(dt):
+        timezone = get_default_timezone()
+        # Resolve times a DST change makes ambiguous rather than raising
+        if hasattr(timezone, 'localize'):
+            dt = timezone.localize(dt, is_dst=False)
+        else:
+            dt = make_aware(dt, timezone)
+    return dt.astimezone(utc)
+
+
+def to_db(dt):
+    """
+    Returns an aware datetime as the value to filter the database with.
+    When USE_TZ is False that is a naive datetime in the default time zone.
+    """
+    if settings.USE_TZ:
+        return dt
+    return make_naive(dt, get_default_timezone())
+
+
+def to_epoch_microseconds(dt):
+    """
+    Returns the number of microseconds between the epoch and a datetime.
+    """
+    delta = to_utc(dt) - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def from_epoch_microseconds(value):
+    """
+    Returns the aware UTC datetime a number of microseconds after the epoch.
+    """
+    return EPOCH + timedelta(microseconds=value)
+
+
+def parse_http_datetime(value):
+    """
+    Parses a string in strict RFC 1123 format, as required by the
+    Memento Accept-Datetime header, and returns an aware UTC datetime.
+    Returns None if the string is not in that format.
+    """
+    match = RFC1123_RE.match(value)
+    if not match:
+        return None
+    day, month, year, hour, minute, second = match.groups()
+    try:
+        return datetime(
+            int(year), MONTHS[month], int(day),
+            int(hour), int(minute), int(second),
+            tzinfo=utc,
+        )
+    except ValueError:
+        return None
+
+
+def parse_accept_datetime(value, fallback=False):
+    """
+    Parses an Accept-Datetime header value and returns an aware UTC
+    datetime, or None if it cannot be parsed.
+
+    The strict RFC 1123 parser is tried first. If fallback is True,
+    values it rejects are handed to dateutil's permissive parser.
+
+    Results are memoized because clients tend to repeat the same values.
+    """
+    value = value.strip()
+    key = (value, fallback)
+    dt = accept_datetime_cache.get(key, _missing)
+    if dt is not _missing:
+        return dt
+    dt = parse_http_datetime(value)
+    if dt is None and fallback:
+        try:
+            dt = dateparser(value)
+        except (ValueError, OverflowError):
+            dt = None
+        else:
+            # HTTP datetimes without a zone are in GMT
+            if is_naive(dt):
+                dt = dt.replace(tzinfo=utc)
+            dt = dt.astimezone(utc)
+    accept_datetime_cache.set(key, dt)
+    return dt
@@ -0,0 +1,83 @@
+import os
+from django.utils.module_loading import import_string
+from django.core.management.base import BaseCommand, CommandError
+from memento.timegate.index import (
+    get_segment_paths,
+    write_index,
+    TimeGateIndex,
+    DELTA_RE
+)
+
+
+class Command(BaseCommand):
+    help = "Compiles the archive into a memory-mapped TimeGate index file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'view',
+            help="Dotted path to an IndexedTimeGateView subclass"
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help="Path of the index file. Defaults to the view's index_path."
+        )
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            default=False,
+            help="Only index mementos added since the last build, in a new "
+                 "delta segment beside the index."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            view = import_string(options['view'])()
+        except ImportError as e:
+            raise CommandError(str(e))
+        path = options['output'] or getattr(view, 'index_path', None)
+        if not path:
+            raise CommandError(
+                "Provide --output or set index_path on the view."
+            )
+
+        queryset = view.get_queryset()
+        if options['delta']:
+            index = TimeGateIndex(path)
+            if not index.segments:
+                raise CommandError(
+                    "%s does not exist. Build a full index first." % path
+                )
+            queryset = queryset.filter(pk__gt=index.max_pk)
+            deltas = get_segment_paths(path)[1:]
+            if deltas:
+                number = int(DELTA_RE.search(deltas[-1]).group(1)) + 1
+            else:
+                number = 1
+            target = '%s.delta.%s' % (path, number)
+        else:
+            target = path
+
+        rows = queryset.order_by(
+            view.url_field,
+            view.datetime_field,
+            'pk'
+        ).values_list(
+            view.url_field,
+            view.datetime_field,
+            'pk'
+        ).iterator()
+        try:
+            count = write_index(target, rows)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['delta'] and not count:
+            os.remove(target)
+            self.stdout.write("No new mementos to index.")
+            return
+        if not options['delta']:
+            # The new index includes everything the deltas held
+            for delta_path in get_segment_paths(path)[1:]:
+                os.remove(delta_path)
+        self.stdout.write("Indexed %s mementos in %s" % (count, target))
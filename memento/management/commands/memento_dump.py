@@ -0,0 +1,69 @@
+from django.apps import apps
+from django.utils.module_loading import import_string
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Streams every memento in the archive to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dump',
+            help="Dotted path to a TimemapDump subclass"
+        )
+        parser.add_argument(
+            '--format',
+            dest='format_name',
+            default=None,
+            help="Output format, 'link' or 'ndjson'. Defaults to the "
+                 "dump's default_format."
+        )
+        parser.add_argument(
+            '--domain',
+            default=None,
+            help="Domain memento links are served from. Defaults to the "
+                 "current Site."
+        )
+        parser.add_argument(
+            '--secure',
+            action='store_true',
+            default=False,
+            help="Use https in memento links"
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help="File to write to. Defaults to stdout."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            dump = import_string(options['dump'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        if isinstance(dump, type):
+            dump = dump()
+
+        format_name = options['format_name'] or dump.default_format
+        if format_name not in dump.generators:
+            raise CommandError("Unknown format '%s'. Choose from %s." % (
+                format_name,
+                ", ".join(sorted(dump.generators))
+            ))
+
+        domain = options['domain']
+        if not domain:
+            if not apps.is_installed('django.contrib.sites'):
+                raise CommandError(
+                    "Provide --domain or install django.contrib.sites."
+                )
+            from django.contrib.sites.models import Site
+            domain = Site.objects.get_current().domain
+
+        # Links are escaped by the generators so the output is plain ASCII
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                dump.write(f, format_name, domain, options['secure'])
+        else:
+            self.stdout.ending = ''
+            dump.write(self.stdout, format_name, domain, options['secure'])
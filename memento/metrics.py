@@ -0,0 +1,399 @@
+import os
+import glob
+import mmap
+import time
+import struct
+import threading
+from django.conf import settings
+from django.dispatch import receiver
+from django.core.signals import setting_changed
+from django.http import Http404, HttpResponse
+from django.core.exceptions import SuspiciousOperation
+from django.utils.module_loading import import_string
+
+DURATION_BUCKETS = (
+    .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, float('inf')
+)
+ITEM_BUCKETS = (
+    1, 10, 100, 1000, 10000, 100000, float('inf')
+)
+
+# (name, type, help, buckets)
+METRICS = (
+    ('memento_requests_total', 'counter',
+     'Requests handled by Memento views by response status.', None),
+    ('memento_request_duration_seconds', 'histogram',
+     'Time spent handling requests to Memento views.', DURATION_BUCKETS),
+    ('memento_db_duration_seconds_total', 'counter',
+     'Time Memento views spent querying the database.', None),
+    ('memento_response_bytes_total', 'counter',
+     'Bytes written in the bodies of Memento responses.', None),
+    ('memento_timemap_items', 'histogram',
+     'Mementos listed in each TimeMap.', ITEM_BUCKETS),
+)
+
+
+def format_sample(name, labels):
+    """
+    Returns the sample's name and labels in the text exposition format.
+    """
+    if not labels:
+        return name
+    return '%s{%s}' % (name, ','.join(
+        '%s="%s"' % (
+            key,
+            ('%s' % value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for key, value in sorted(labels.items())
+    ))
+
+
+def format_bucket(bound):
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
+
+
+class LocalStore(object):
+    """
+    Keeps samples in the memory of the current process.
+    """
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0.0) + amount
+
+    def items(self):
+        with self.lock:
+            return list(self.samples.items())
+
+
+class MmapFile(object):
+    """
+    A file of float samples keyed by string that is mapped into memory.
+
+    The first eight bytes hold the number of bytes in use. Each sample
+    after that is the length of its key, the key padded to a multiple of
+    eight bytes and an eight byte float.
+    """
+    initial_size = 1 << 16
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'a+b')
+        capacity = os.fstat(self.f.fileno()).st_size
+        if capacity == 0:
+            capacity = self.initial_size
+            self.f.truncate(capacity)
+        self.capacity = capacity
+        self.m = mmap.mmap(self.f.fileno(), capacity)
+        self.used = struct.unpack_from('<i', self.m, 0)[0] or 8
+        self.positions = {}
+        for key, value, pos in self.read(self.m, self.used):
+            self.positions[key] = pos
+
+    @staticmethod
+    def read(data, used=None):
+        """
+        Yields the key, value and offset of every sample in the data.
+        """
+        if used is None:
+            used = struct.unpack_from('<i', data, 0)[0] if data else 0
+        pos = 8
+        while pos < used:
+            length = struct.unpack_from('<i', data, pos)[0]
+            pos += 4
+            key = data[pos:pos + length].decode('utf-8')
+            pos += length + (8 - (length + 4) % 8) % 8
+            value = struct.unpack_from('<d', data, pos)[0]
+            yield key, value, pos
+            pos += 8
+
+    def grow(self, size):
+        capacity = self.capacity
+        while self.used + size > capacity:
+            capacity *= 2
+        self.m.close()
+        self.f.truncate(capacity)
+        self.capacity = capacity
+        self.m = mmap.mmap(self.f.fileno(), capacity)
+
+    def append(self, key):
+        encoded = key.encode('utf-8')
+        padding = (8 - (len(encoded) + 4) % 8) % 8
+        size = 4 + len(encoded) + padding + 8
+        if self.used + size > self.capacity:
+            self.grow(size)
+        struct.pack_into(
+            '<i%dsd' % (len(encoded) + padding),
+            self.m,
+            self.used,
+            len(encoded),
+            encoded,
+            0.0
+        )
+        self.used += size
+        # Only publish the sample once it is fully written
+        struct.pack_into('<i', self.m, 0, self.used)
+        pos = self.used - 8
+        self.positions[key] = pos
+        return pos
+
+    def inc(self, key, amount):
+        pos = self.positions.get(key)
+        if pos is None:
+            pos = self.append(key)
+        value = struct.unpack_from('<d', self.m, pos)[0]
+        struct.pack_into('<d', self.m, pos, value + amount)
+
+    def close(self):
+        self.m.close()
+        self.f.close()
+
+
+class FileStore(object):
+    """
+    Keeps each process's samples in its own memory-mapped file within a
+    shared directory, and sums the samples from every file when read.
+
+    The directory should be emptied each time the server is restarted.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file = None
+
+    def get_file(self):
+        # A forked worker must not write to its parent's file
+        pid = os.getpid()
+        if self.pid != pid:
+            self.pid = pid
+            self.file = MmapFile(
+                os.path.join(self.directory, 'memento_%s.db' % pid)
+            )
+        return self.file
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.get_file().inc(key, amount)
+
+    def items(self):
+        samples = {}
+        pattern = os.path.join(self.directory, 'memento_*.db')
+        for path in glob.glob(pattern):
+            with open(path, 'rb') as f:
+                data = f.read()
+            for key, value, pos in MmapFile.read(data):
+                samples[key] = samples.get(key, 0.0) + value
+        return list(samples.items())
+
+
+class MetricsRegistry(object):
+    """
+    Records samples for the metrics the Memento views report.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.metrics = dict((m[0], m) for m in METRICS)
+
+    def inc(self, name, labels, amount=1):
+        self.store.inc(format_sample(name, labels), amount)
+
+    def observe(self, name, labels, value):
+        """
+        Adds a value to a histogram. Every bucket is written, even those
+        the value is above, so each label set has a complete series.
+        """
+        buckets = self.metrics[name][3]
+        for bound in buckets:
+            bucket_labels = dict(labels, le=format_bucket(bound))
+            self.inc('%s_bucket' % name, bucket_labels, int(value <= bound))
+        self.inc('%s_sum' % name, labels, value)
+        self.inc('%s_count' % name, labels)
+
+    def collect(self):
+        """
+        Returns a list of (name, type, help, samples) for each metric, with
+        its samples as a sorted list of (sample, value) pairs.
+        """
+        families = dict((name, []) for name in self.metrics)
+        for key, value in self.store.items():
+            name = key.split('{', 1)[0]
+            if name not in families:
+                for suffix in ('_bucket', '_sum', '_count'):
+                    if name.endswith(suffix):
+                        name = name[:-len(suffix)]
+                        break
+            if name in families:
+                families[name].append((key, value))
+        return [
+            (metric[0], metric[1], metric[2], sorted(families[metric[0]]))
+            for metric in METRICS
+        ]
+
+
+class TextExporter(object):
+    """
+    Exports the metrics in the Prometheus text exposition format.
+    """
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def export(self, registry):
+        lines = []
+        for name, kind, help_text, samples in registry.collect():
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for key, value in samples:
+                lines.append('%s %s' % (key, repr(float(value))))
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics(object):
+    """
+    Collects the metrics for a single request to a view. Nothing is
+    recorded if the registry is None.
+    """
+    def __init__(self, registry, view):
+        self.registry = registry
+        self.view = view
+        self.start = time.time()
+        self.db_time = 0.0
+        self.items = None
+
+    def db(self):
+        return DatabaseTimer(self)
+
+    def track(self, func, *args, **kwargs):
+        """
+        Calls the view function and records the metrics for its response.
+        """
+        response = None
+        status = 500
+        try:
+            response = func(*args, **kwargs)
+            status = response.status_code
+            return response
+        except Http404:
+            status = 404
+            raise
+        except SuspiciousOperation:
+            status = 400
+            raise
+        finally:
+            self.finish(status, response)
+
+    def finish(self, status, response=None):
+        if self.registry is None:
+            return
+        labels = {'view': self.view}
+        self.registry.inc(
+            'memento_requests_total',
+            dict(labels, status=status)
+        )
+        self.registry.observe(
+            'memento_request_duration_seconds',
+            labels,
+            time.time() - self.start
+        )
+        self.registry.inc(
+            'memento_db_duration_seconds_total',
+            labels,
+            self.db_time
+        )
+        if self.items is not None:
+            self.registry.observe('memento_timemap_items', labels, self.items)
+        if response is not None and not response.streaming:
+            if getattr(response, 'is_rendered', True):
+                self.add_bytes(response)
+            else:
+                response.add_post_render_callback(self.add_bytes)
+
+    def add_bytes(self, response):
+        self.registry.inc(
+            'memento_response_bytes_total',
+            {'view': self.view},
+            len(response.content)
+        )
+
+
+class DatabaseTimer(object):
+    """
+    Adds the time spent inside the block to the request's database time.
+    """
+    def __init__(self, request_metrics):
+        self.request_metrics = request_metrics
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc_info):
+        if self.request_metrics.registry is not None:
+            self.request_metrics.db_time += time.time() - self.start
+
+
+# Stands in for views whose hooks are called without dispatching a request
+NULL_REQUEST_METRICS = RequestMetrics(None, None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the process's MetricsRegistry, or None if metrics are off.
+    """
+    global _registry
+    if not getattr(settings, 'MEMENTO_METRICS', False):
+        return None
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                directory = getattr(settings, 'MEMENTO_METRICS_DIR', None)
+                if directory:
+                    store = FileStore(directory)
+                else:
+                    store = LocalStore()
+                _registry = MetricsRegistry(store)
+    return _registry
+
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    global _registry
+    if setting.startswith('MEMENTO_METRICS'):
+        _registry = None
+
+
+def start_request(view):
+    """
+    Returns a RequestMetrics for a request to the named view.
+    """
+    return RequestMetrics(get_registry(), view)
+
+
+def get_exporter():
+    path = getattr(
+        settings,
+        'MEMENTO_METRICS_EXPORTER',
+        'memento.metrics.TextExporter'
+    )
+    return import_string(path)()
+
+
+def metrics_view(request):
+    """
+    Returns the metrics for every Memento view in the exporter's format.
+    """
+    registry = get_registry()
+    if registry is None:
+        raise Http404("Memento metrics are disabled.")
+    exporter = get_exporter()
+    return HttpResponse(
+        exporter.export(registry),
+        content_type=exporter.content_type
+    )
@@ -0,0 +1,41 @@
+import django
+from django.db.models.query import prefetch_related_objects
+
+
+class MementoRelatedMixin(object):
+    """
+    Applies select_related and prefetch_related to the querysets a view
+    reads mementos from, so objects their URLs are built from are
+    fetched in bulk rather than once for each memento.
+    """
+    memento_select_related = None
+    memento_prefetch_related = None
+
+    def apply_memento_related(self, queryset, prefetch=True):
+        """
+        Returns the queryset with the view's related object hints applied.
+        Pass prefetch=False to leave out the prefetch_related lookups.
+        """
+        # memento_list may return any iterable, not just a queryset
+        if not hasattr(queryset, 'select_related'):
+            return queryset
+        if self.memento_select_related:
+            queryset = queryset.select_related(*self.memento_select_related)
+        if prefetch and self.memento_prefetch_related:
+            queryset = queryset.prefetch_related(
+                *self.memento_prefetch_related
+            )
+        return queryset
+
+    def prefetch_memento_related(self, objects):
+        """
+        Runs the prefetch_related lookups for objects already fetched.
+        """
+        if not self.memento_prefetch_related:
+            return
+        lookups = list(self.memento_prefetch_related)
+        # Django 1.10 takes the lookups as positional arguments
+        if django.VERSION[:2] >= (1, 10):
+            prefetch_related_objects(list(objects), *lookups)
+        else:
+            prefetch_related_objects(list(objects), lookups)
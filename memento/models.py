@@ -0,0 +1,23 @@
+from django.db import models
+
+
+class MementoModel(models.Model):
+    """
+    An abstract base model for an archived resource.
+
+    It provides the two fields the TimeGate and TimeMap views filter and
+    sort on and a composite index over them, so every nearest-memento
+    probe is a range scan on the index rather than a full table scan.
+
+    Subclasses that declare their own Meta should inherit from
+    MementoModel.Meta to keep the index.
+    """
+    url = models.URLField(max_length=255)
+    datetime = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+        index_together = (
+            ('url', 'datetime'),
+        )
+        get_latest_by = 'datetime'
@@ -0,0 +1,191 @@
+from bisect import bisect_right
+from memento.dates import to_utc
+from django.core.exceptions import ImproperlyConfigured
+
+
+class Partition(object):
+    """
+    A range of archive datetimes and where the mementos in it are stored.
+
+    The range includes its start and excludes its end. Either may be None
+    to leave that side open.
+
+    By default the partition is read from the view's own queryset, with
+    the range added to the query so the database can skip the tables
+    that do not overlap it. Provide a database alias as using, or a
+    model or queryset, to read the partition from somewhere else.
+    """
+    def __init__(self, start=None, end=None, using=None, model=None,
+                 queryset=None):
+        if model is not None and queryset is None:
+            queryset = model._default_manager.all()
+        self.start = start
+        self.end = end
+        self.using = using
+        self.queryset = queryset
+
+    def __repr__(self):
+        return '<Partition: %s to %s>' % (self.start, self.end)
+
+    def get_queryset(self, queryset):
+        """
+        Returns the queryset the partition is read from, given the view's.
+        """
+        if self.queryset is not None:
+            queryset = self.queryset.all()
+        if self.using:
+            queryset = queryset.using(self.using)
+        return queryset
+
+    def filter(self, queryset, datetime_field):
+        """
+        Restricts the queryset to the partition's range.
+        """
+        lookups = {}
+        if self.start is not None:
+            lookups['%s__gte' % datetime_field] = self.start
+        if self.end is not None:
+            lookups['%s__lt' % datetime_field] = self.end
+        return queryset.filter(**lookups)
+
+
+class PartitionMap(object):
+    """
+    A list of non-overlapping partitions sorted by datetime.
+    """
+    def __init__(self, partitions):
+        def start_key(partition):
+            if partition.start is None:
+                return (0, None)
+            return (1, to_utc(partition.start))
+        self.partitions = sorted(partitions, key=start_key)
+        for previous, partition in zip(self.partitions, self.partitions[1:]):
+            if previous.end is None or partition.start is None or \
+                    to_utc(previous.end) > to_utc(partition.start):
+                raise ImproperlyConfigured(
+                    "Memento partitions %r and %r overlap." % (
+                        previous,
+                        partition
+                    )
+                )
+        self.starts = [
+            to_utc(p.start) for p in self.partitions if p.start is not None
+        ]
+        self.open_start = len(self.partitions) - len(self.starts)
+
+    def __iter__(self):
+        return iter(self.partitions)
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def __reversed__(self):
+        return reversed(self.partitions)
+
+    def before(self, dt):
+        """
+        Yields the partition that would contain the datetime, followed by
+        each earlier partition, nearest first.
+        """
+        index = self.open_start + bisect_right(self.starts, to_utc(dt)) - 1
+        for i in range(index, -1, -1):
+            yield self.partitions[i]
+
+    def after(self, dt):
+        """
+        Yields the partition that would contain the datetime, followed by
+        each later partition, nearest first.
+        """
+        dt = to_utc(dt)
+        index = max(
+            self.open_start + bisect_right(self.starts, dt) - 1,
+            0
+        )
+        for partition in self.partitions[index:]:
+            if partition.end is None or to_utc(partition.end) > dt:
+                yield partition
+
+
+_partition_maps = {}
+
+
+class PartitionMixin(object):
+    """
+    Adds a partitions attribute to a view that lists the Partition objects
+    its archive is split into.
+    """
+    partitions = None
+
+    def get_partition_map(self):
+        """
+        Returns the PartitionMap for the partitions attribute. It is built
+        and validated once for each class rather than on every request.
+        """
+        if isinstance(self.partitions, PartitionMap):
+            return self.partitions
+        cls = self.__class__
+        cached = _partition_maps.get(cls)
+        if cached is None or cached[0] is not self.partitions:
+            cached = (self.partitions, PartitionMap(self.partitions))
+            _partition_maps[cls] = cached
+        return cached[1]
+
+
+class PartitionedList(object):
+    """
+    Reads a list of querysets, one for each partition, in order as if
+    they were a single list.
+
+    It supports the parts of the QuerySet API used by TimemapLinkList and
+    Django's Paginator.
+    """
+    ordered = True
+
+    def __init__(self, querysets):
+        self.querysets = list(querysets)
+        self._counts = None
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    def filter(self, *args, **kwargs):
+        return PartitionedList(
+            qs.filter(*args, **kwargs) for qs in self.querysets
+        )
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [qs.count() for qs in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            for obj in queryset:
+                yield obj
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("PartitionedList only supports simple slices.")
+        start = key.start or 0
+        stop = key.stop
+        results = []
+        offset = 0
+        for queryset, count in zip(self.querysets, self.counts()):
+            if stop is not None and offset >= stop:
+                break
+            low = max(start - offset, 0)
+            if stop is None:
+                high = count
+            else:
+                high = min(stop - offset, count)
+            if low < high:
+                results.extend(queryset[low:high])
+            offset += count
+        return results
@@ -1,7 +1,712 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from django.db import models
+from django.http import HttpResponse
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.timezone import utc
+from django.conf.urls import url
+from django.core.urlresolvers import resolve
+from django.test import (
+    TestCase,
+    RequestFactory,
+    SimpleTestCase,
+    override_settings
+)
+from memento.models import MementoModel
+from django.utils.six import StringIO
+from django.core.management import call_command
+from memento.timemap import TimemapDump, TimemapLinkList
+from memento.timegate import TimeGateView, MementoDetailView
+from memento.timegate.index import (
+    IndexedTimeGateView,
+    TimeGateIndex,
+    get_index,
+    write_index
+)
+from memento.checks import check_view_index
+from memento.partitions import Partition, PartitionMap
+from memento.metrics import (
+    ITEM_BUCKETS,
+    FileStore,
+    MmapFile,
+    MetricsRegistry,
+    metrics_view
+)
+from memento.dates import (
+    parse_accept_datetime,
+    parse_http_datetime,
+    to_epoch_microseconds,
+    from_epoch_microseconds
+)
 
 
+class Page(models.Model):
+    url = models.URLField()
+
+
+class IndexedMemento(MementoModel):
+
+    def get_absolute_url(self):
+        return '/memento/%s/' % self.pk
+
+
+class Snapshot(MementoModel):
+    page = models.ForeignKey(Page)
+
+    def get_absolute_url(self):
+        return '/page/%s/snapshot/%s/' % (self.page.pk, self.pk)
+
+
+class UnindexedMemento(models.Model):
+    page = models.ForeignKey(Page)
+    timestamp = models.DateTimeField()
+
+
+class ExampleTimeGateView(TimeGateView):
+    model = IndexedMemento
+    timemap_pattern_name = 'timemap'
+
+
+class ExampleMementoDetailView(MementoDetailView):
+    model = IndexedMemento
+    timemap_pattern_name = 'timemap'
+    timegate_pattern_name = 'timegate'
+
+    def get_original_url(self, obj):
+        return obj.url
+
+    def render_to_response(self, context, **response_kwargs):
+        return HttpResponse()
+
+
+class MirroredMementoDetailView(ExampleMementoDetailView):
+
+    def get_timemap_url(self, request, url):
+        return 'http://mirror.example.org/timemap/%s' % url
+
+
+class ExampleTimemapLinkList(TimemapLinkList):
+    since_field = 'id'
+
+    def get_object(self, request, url):
+        return url
+
+    def get_original_url(self, obj):
+        return obj
+
+    def memento_list(self, obj):
+        return IndexedMemento.objects.filter(url=obj).order_by('datetime')
+
+    def memento_datetime(self, item):
+        return item.datetime
+
+
+MAY_2 = datetime(2015, 5, 2, tzinfo=utc)
+MAY_5 = datetime(2015, 5, 5, tzinfo=utc)
+PARTITIONS = [
+    Partition(MAY_5, None),
+    Partition(None, MAY_2),
+    Partition(MAY_2, MAY_5),
+]
+
+
+class PartitionedTimeGateView(ExampleTimeGateView):
+    partitions = PARTITIONS
+
+
+class PartitionedTimemapLinkList(ExampleTimemapLinkList):
+    partitions = PARTITIONS
+    paginate_by = 2
+
+
+class SnapshotTimeGateView(TimeGateView):
+    model = Snapshot
+    memento_prefetch_related = ('page',)
+
+
+class ExampleIndexedTimeGateView(IndexedTimeGateView):
+    model = IndexedMemento
+    index_fallback = False
+
+
+class SnapshotTimemapLinkList(TimemapLinkList):
+    memento_select_related = ('page',)
+
+    def get_object(self, request, url):
+        return url
+
+    def get_original_url(self, obj):
+        return obj
+
+    def memento_list(self, obj):
+        return Snapshot.objects.filter(url=obj).order_by('datetime')
+
+    def memento_datetime(self, item):
+        return item.datetime
+
+
+class SnapshotTimemapDump(TimemapDump):
+    model = Snapshot
+    chunk_size = 2
+    memento_prefetch_related = ('page',)
+
+
+class ExampleTimemapDump(TimemapDump):
+    model = IndexedMemento
+    chunk_size = 2
+
+
+urlpatterns = [
+    url(r'^partitioned/timegate/(?P<url>.*)$',
+        PartitionedTimeGateView.as_view()),
+    url(r'^partitioned/timemap/(?P<url>.*)$', PartitionedTimemapLinkList()),
+    url(r'^indexed/timegate/(?P<url>.*)$',
+        ExampleIndexedTimeGateView.as_view()),
+    url(r'^snapshot/timemap/(?P<url>.*)$', SnapshotTimemapLinkList()),
+    url(r'^snapshot/dump/$', SnapshotTimemapDump()),
+    url(r'^snapshot/timegate/(?P<url>.*)$', SnapshotTimeGateView.as_view()),
+    url(r'^timemap/dump/$', ExampleTimemapDump(), name='timemap-dump'),
+    url(r'^timegate/(?P<url>.*)$', ExampleTimeGateView.as_view(),
+        name='timegate'),
+    url(r'^timemap/link/(?P<url>.*)$', ExampleTimemapLinkList(),
+        name='timemap'),
+    url(r'^memento/(?P<pk>\d+)/$', ExampleMementoDetailView.as_view(),
+        name='memento'),
+    url(r'^mirrored/(?P<pk>\d+)/$', MirroredMementoDetailView.as_view()),
+]
+
+
+@override_settings(
+    ROOT_URLCONF='memento.tests',
+    USE_TZ=True,
+    TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+    }]
+)
 class MementoTest(TestCase):
 
-    def test_memento(self):
-        pass
+    def setUp(self):
+        self.mementos = {}
+        for day in (1, 3, 10):
+            self.mementos[day] = IndexedMemento.objects.create(
+                url='http://example.com/',
+                datetime=datetime(2015, 5, day, tzinfo=utc)
+            )
+
+    def test_timegate(self):
+        response = self.client.get(
+            '/timegate/http://example.com/',
+            HTTP_ACCEPT_DATETIME='Mon, 04 May 2015 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 302)
+        obj = self.mementos[3]
+        self.assertEqual(
+            response['Location'],
+            'http://testserver/memento/%s/' % obj.pk
+        )
+        self.assertEqual(
+            response['Link'],
+            '<http://example.com/>; rel="original", '
+            '<http://testserver/timemap/link/http://example.com/>; '
+            'rel="timemap"; type="application/link-format"'
+        )
+
+    def test_timegate_local_time(self):
+        with self.settings(USE_TZ=False, TIME_ZONE='America/New_York'):
+            IndexedMemento.objects.all().delete()
+            for hour in (8, 12):
+                self.mementos[hour] = IndexedMemento.objects.create(
+                    url='http://example.com/',
+                    datetime=datetime(2015, 5, 1, hour)
+                )
+            response = self.client.get(
+                '/timegate/http://example.com/',
+                HTTP_ACCEPT_DATETIME='Fri, 01 May 2015 12:00:00 GMT'
+            )
+        self.assertEqual(
+            response['Location'],
+            'http://testserver/memento/%s/' % self.mementos[8].pk
+        )
+
+    def test_timegate_malformed(self):
+        response = self.client.get(
+            '/timegate/http://example.com/',
+            HTTP_ACCEPT_DATETIME='yesterday'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail(self):
+        obj = self.mementos[1]
+        response = self.client.get('/memento/%s/' % obj.pk)
+        self.assertEqual(
+            response['Memento-Datetime'],
+            'Fri, 01 May 2015 00:00:00 GMT'
+        )
+        self.assertEqual(
+            response['Link'],
+            '<http://example.com/>; rel="original", '
+            '<http://testserver/timemap/link/http://example.com/>; '
+            'rel="timemap"; type="application/link-format", '
+            '<http://testserver/timegate/http://example.com/>; '
+            'rel="timegate"'
+        )
+
+    def test_hooks_without_dispatch(self):
+        obj = self.mementos[1]
+        view = ExampleMementoDetailView(kwargs={'pk': obj.pk})
+        self.assertEqual(view.get_object(), obj)
+        view = ExampleTimeGateView(kwargs={'url': 'http://example.com/'})
+        response = view.get(RequestFactory().get('/'))
+        self.assertEqual(
+            response['Location'],
+            'http://testserver/memento/%s/' % self.mementos[10].pk
+        )
+
+    def test_link_url_hooks(self):
+        obj = self.mementos[1]
+        response = self.client.get('/mirrored/%s/' % obj.pk)
+        self.assertEqual(
+            response['Link'],
+            '<http://example.com/>; rel="original", '
+            '<http://mirror.example.org/timemap/http://example.com/>; '
+            'rel="timemap"; type="application/link-format", '
+            '<http://testserver/timegate/http://example.com/>; '
+            'rel="timegate"'
+        )
+
+    def test_partitioned_timegate(self):
+        for header, day in (
+            ('Mon, 04 May 2015 00:00:00 GMT', 3),
+            ('Thu, 07 May 2015 12:00:00 GMT', 10),
+            ('Wed, 06 May 2015 12:00:00 GMT', 3),
+            ('Fri, 01 May 2015 00:00:00 GMT', 1),
+            ('Fri, 01 Jan 2016 00:00:00 GMT', 10),
+        ):
+            response = self.client.get(
+                '/partitioned/timegate/http://example.com/',
+                HTTP_ACCEPT_DATETIME=header
+            )
+            self.assertEqual(
+                response['Location'],
+                'http://testserver/memento/%s/' % self.mementos[day].pk
+            )
+        response = self.client.get(
+            '/partitioned/timegate/http://example.com/',
+            HTTP_ACCEPT_DATETIME='Thu, 30 Apr 2015 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/partitioned/timegate/http://example.com/')
+        self.assertEqual(
+            response['Location'],
+            'http://testserver/memento/%s/' % self.mementos[10].pk
+        )
+
+    def test_partitioned_timemap(self):
+        response = self.client.get(
+            '/partitioned/timemap/http://example.com/?page=2'
+        )
+        self.assertNotIn('X-Memento-Since', response)
+        self.assertEqual(response.content.count(b'rel="'), 3)
+        self.assertIn(
+            b'/memento/%s/' % self.mementos[10].pk,
+            response.content
+        )
+        response = self.client.get('/partitioned/timemap/http://example.com/')
+        self.assertEqual(
+            response['X-Memento-Since'],
+            str(self.mementos[10].pk)
+        )
+
+    def test_partitioned_since(self):
+        view = PartitionedTimemapLinkList()
+        self.assertIs(view.get_partition_map(), view.get_partition_map())
+
+        class CrossDatabaseTimemapLinkList(ExampleTimemapLinkList):
+            partitions = [
+                Partition(None, MAY_5),
+                Partition(MAY_5, None, using='default'),
+            ]
+        view = CrossDatabaseTimemapLinkList()
+        with self.assertRaises(ImproperlyConfigured):
+            view(RequestFactory().get('/'), 'http://example.com/')
+        view.since_field = 'datetime'
+        response = view(RequestFactory().get('/'), 'http://example.com/')
+        self.assertEqual(
+            response['X-Memento-Since'],
+            str(to_epoch_microseconds(self.mementos[10].datetime))
+        )
+
+    def test_indexed_timegate(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'timegate.idx')
+        ExampleIndexedTimeGateView.index_path = path
+        self.addCleanup(
+            setattr, ExampleIndexedTimeGateView, 'index_path', None
+        )
+        call_command(
+            'memento_build_index',
+            'memento.tests.ExampleIndexedTimeGateView',
+            stdout=StringIO()
+        )
+
+        def get_location(header=None):
+            kwargs = {}
+            if header:
+                kwargs['HTTP_ACCEPT_DATETIME'] = header
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    '/indexed/timegate/http://example.com/',
+                    **kwargs
+                )
+            return response['Location']
+
+        for header, day in (
+            ('Mon, 04 May 2015 00:00:00 GMT', 3),
+            ('Sat, 02 May 2015 00:00:00 GMT', 1),
+            ('Thu, 07 May 2015 12:00:00 GMT', 10),
+            (None, 10),
+        ):
+            self.assertEqual(
+                get_location(header),
+                'http://testserver/memento/%s/' % self.mementos[day].pk
+            )
+        response = self.client.get(
+            '/indexed/timegate/http://example.org/',
+            HTTP_ACCEPT_DATETIME='Mon, 04 May 2015 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 404)
+
+        new = IndexedMemento.objects.create(
+            url='http://example.com/',
+            datetime=datetime(2015, 5, 7, tzinfo=utc)
+        )
+        call_command(
+            'memento_build_index',
+            'memento.tests.ExampleIndexedTimeGateView',
+            delta=True,
+            stdout=StringIO()
+        )
+        self.assertTrue(os.path.exists(path + '.delta.1'))
+        get_index(path).refresh(force=True)
+        self.assertEqual(
+            get_location('Thu, 07 May 2015 12:00:00 GMT'),
+            'http://testserver/memento/%s/' % new.pk
+        )
+
+        call_command(
+            'memento_build_index',
+            'memento.tests.ExampleIndexedTimeGateView',
+            stdout=StringIO()
+        )
+        self.assertFalse(os.path.exists(path + '.delta.1'))
+
+        # A row edited since the build is not served for its old URL
+        IndexedMemento.objects.filter(pk=self.mementos[10].pk).update(
+            url='http://example.org/'
+        )
+        self.assertEqual(
+            self.client.get('/indexed/timegate/http://example.com/')[
+                'Location'
+            ],
+            'http://testserver/memento/%s/' % new.pk
+        )
+
+    def test_related(self):
+        for i in range(5):
+            Snapshot.objects.create(
+                url='http://example.com/',
+                datetime=datetime(2015, 5, 1, i, tzinfo=utc),
+                page=Page.objects.create(url='http://example.com/')
+            )
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/snapshot/timemap/http://example.com/'
+            )
+        self.assertEqual(response.content.count(b'/page/'), 5)
+        # Two probes for the nearest memento and one prefetch for its page
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/snapshot/timegate/http://example.com/',
+                HTTP_ACCEPT_DATETIME='Fri, 01 May 2015 02:10:00 GMT'
+            )
+        self.assertEqual(response.status_code, 302)
+        # One query for each chunk of mementos and another for their pages
+        with self.assertNumQueries(6):
+            response = self.client.get('/snapshot/dump/')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 5)
+
+    def test_timemap_since(self):
+        view = ExampleTimemapLinkList()
+        view.since_field = 'pk'
+        response = view(
+            RequestFactory().get('/', {'since': self.mementos[1].pk}),
+            'http://example.com/'
+        )
+        self.assertEqual(response.content.count(b'rel="'), 4)
+        self.assertEqual(
+            response['X-Memento-Since'],
+            str(self.mementos[10].pk)
+        )
+
+        response = self.client.get('/timemap/link/http://example.com/')
+        self.assertEqual(response.content.count(b'rel="'), 5)
+        token = response['X-Memento-Since']
+        self.assertEqual(token, str(self.mementos[10].pk))
+
+        response = self.client.get(
+            '/timemap/link/http://example.com/?since=%s' % token
+        )
+        self.assertEqual(response.content.count(b'rel="'), 2)
+        self.assertEqual(response['X-Memento-Since'], token)
+
+        new = IndexedMemento.objects.create(
+            url='http://example.com/',
+            datetime=datetime(2015, 5, 11, tzinfo=utc)
+        )
+        response = self.client.get(
+            '/timemap/link/http://example.com/?since=%s' % token
+        )
+        self.assertEqual(response.content.count(b'rel="'), 3)
+        self.assertIn(b'/memento/%s/' % new.pk, response.content)
+        self.assertEqual(response['X-Memento-Since'], str(new.pk))
+
+    @override_settings(MEMENTO_METRICS=True)
+    def test_metrics(self):
+        self.client.get(
+            '/timegate/http://example.com/',
+            HTTP_ACCEPT_DATETIME='Mon, 04 May 2015 00:00:00 GMT'
+        )
+        self.client.get('/timegate/http://example.org/')
+        self.client.get('/timemap/link/http://example.com/')
+        # The shared TimemapLinkList instance keeps no per-request state
+        timemap = resolve('/timemap/link/http://example.com/').func
+        self.assertFalse(hasattr(timemap, 'request_metrics'))
+        response = metrics_view(None)
+        self.assertIn(
+            b'memento_requests_total{status="302",'
+            b'view="ExampleTimeGateView"} 1.0',
+            response.content
+        )
+        self.assertIn(
+            b'memento_requests_total{status="404",'
+            b'view="ExampleTimeGateView"} 1.0',
+            response.content
+        )
+        self.assertIn(
+            b'memento_timemap_items_sum{view="ExampleTimemapLinkList"} 3.0',
+            response.content
+        )
+
+    def test_dump(self):
+        response = self.client.get('/timemap/dump/')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            lines[0],
+            b'<http://testserver/memento/%s/>; rel="memento"; '
+            b'datetime="Fri, 01 May 2015 00:00:00 GMT"; '
+            b'anchor="http://example.com/",' % self.mementos[1].pk
+        )
+
+    def test_dump_command(self):
+        out = StringIO()
+        call_command(
+            'memento_dump',
+            'memento.tests.ExampleTimemapDump',
+            format_name='ndjson',
+            domain='example.org',
+            stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"memento_url": "http://example.org/memento/', lines[2])
+
+
+class MetricsStoreTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_file_store(self):
+        store = FileStore(self.directory)
+        registry = MetricsRegistry(store)
+        registry.inc('memento_requests_total', {'view': 'a', 'status': 302})
+        registry.observe('memento_timemap_items', {'view': 'b'}, 12)
+        # Samples from another worker's file are summed in
+        other = MmapFile(os.path.join(self.directory, 'memento_0.db'))
+        for i in range(10):
+            other.inc(
+                'memento_requests_total{status="302",view="a"}',
+                2
+            )
+        other.close()
+        samples = dict(store.items())
+        self.assertEqual(
+            samples['memento_requests_total{status="302",view="a"}'],
+            21.0
+        )
+        self.assertEqual(
+            samples['memento_timemap_items_bucket{le="100.0",view="b"}'],
+            1.0
+        )
+        self.assertEqual(
+            samples['memento_timemap_items_bucket{le="10.0",view="b"}'],
+            0.0
+        )
+        self.assertEqual(
+            len([k for k in samples if k.endswith('view="b"}')]),
+            len(ITEM_BUCKETS) + 2
+        )
+
+    def test_file_growth(self):
+        path = os.path.join(self.directory, 'memento_1.db')
+        f = MmapFile(path)
+        for i in range(5000):
+            f.inc('sample_%s' % i, i)
+        f.close()
+        with open(path, 'rb') as f:
+            data = f.read()
+        samples = dict(
+            (key, value) for key, value, pos in MmapFile.read(data)
+        )
+        self.assertEqual(len(samples), 5000)
+        self.assertEqual(samples['sample_4999'], 4999.0)
+
+
+class IndexFileTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'timegate.idx')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_interleaved_urls(self):
+        # A case-insensitive collation can split a URL's rows into runs
+        write_index(self.path, [
+            ('http://X.com/', datetime(2015, 1, 1, tzinfo=utc), 1),
+            ('http://x.com/', datetime(2015, 1, 2, tzinfo=utc), 2),
+            ('http://X.com/', datetime(2015, 1, 3, tzinfo=utc), 3),
+            ('http://x.com/', datetime(2015, 1, 4, tzinfo=utc), 4),
+        ])
+        index = TimeGateIndex(self.path)
+        jan_3 = datetime(2015, 1, 3, tzinfo=utc)
+        self.assertEqual(index.get_nearest_pk('http://X.com/', jan_3), 3)
+        self.assertEqual(index.get_nearest_pk('http://x.com/', jan_3), 2)
+        self.assertEqual(index.get_latest_pk('http://X.com/'), 3)
+        self.assertEqual(index.get_latest_pk('http://x.com/'), 4)
+        self.assertEqual(index.segments[0].url_count, 2)
+
+    def test_rebuild_same_second(self):
+        jan_1 = datetime(2015, 1, 1, tzinfo=utc)
+        write_index(self.path, [('http://x.com/', jan_1, 1)])
+        # Mimic a filesystem that keeps modification times to the second
+        mtime = int(os.stat(self.path).st_mtime)
+        os.utime(self.path, (mtime, mtime))
+        index = TimeGateIndex(self.path)
+        write_index(self.path, [
+            ('http://x.com/', jan_1, 1),
+            ('http://y.com/', jan_1, 2),
+        ])
+        os.utime(self.path, (mtime, mtime))
+        index.refresh(force=True)
+        self.assertEqual(index.get_latest_pk('http://y.com/'), 2)
+
+    def test_failed_write(self):
+        # A directory in the way makes the final rename fail
+        os.mkdir(self.path)
+        with self.assertRaises(OSError):
+            write_index(self.path, [
+                ('http://x.com/', datetime(2015, 1, 1, tzinfo=utc), 1)
+            ])
+        self.assertEqual(os.listdir(self.directory), ['timegate.idx'])
+
+
+class PartitionMapTest(SimpleTestCase):
+
+    def test_walk(self):
+        partitions = PartitionMap(PARTITIONS)
+        self.assertEqual(
+            [p.end for p in partitions.before(datetime(2015, 5, 3))],
+            [MAY_5, MAY_2]
+        )
+        self.assertEqual(
+            [p.start for p in partitions.after(datetime(2015, 5, 3))],
+            [MAY_2, MAY_5]
+        )
+
+    def test_overlap(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PartitionMap([
+                Partition(None, datetime(2015, 5, 2, tzinfo=utc)),
+                Partition(datetime(2015, 5, 1, tzinfo=utc), None),
+            ])
+
+
+class IndexCheckTest(SimpleTestCase):
+
+    def get_view(self, **attrs):
+        return type('CheckedTimeGateView', (TimeGateView,), attrs)
+
+    def test_indexed_model(self):
+        view = self.get_view(model=IndexedMemento)
+        self.assertEqual(check_view_index(view), [])
+
+    def test_unindexed_model(self):
+        view = self.get_view(
+            model=UnindexedMemento,
+            url_field='page__url',
+            datetime_field='timestamp',
+        )
+        errors = check_view_index(view)
+        self.assertEqual([e.id for e in errors], ['memento.W001'])
+
+    def test_missing_field(self):
+        view = self.get_view(model=UnindexedMemento)
+        errors = check_view_index(view)
+        self.assertEqual(
+            sorted(e.id for e in errors),
+            ['memento.E001', 'memento.E001'],
+        )
+
+
+class AcceptDatetimeTest(SimpleTestCase):
+
+    def test_rfc1123(self):
+        self.assertEqual(
+            parse_http_datetime('Fri, 01 May 2015 00:01:00 GMT'),
+            datetime(2015, 5, 1, 0, 1, tzinfo=utc)
+        )
+        self.assertEqual(
+            parse_http_datetime('Fri, 1 May 2015 00:01:00 GMT'),
+            datetime(2015, 5, 1, 0, 1, tzinfo=utc)
+        )
+
+    def test_strict(self):
+        self.assertIsNone(parse_http_datetime('2015-05-01T00:01:00Z'))
+        self.assertIsNone(parse_http_datetime('Fri, 31 Feb 2015 00:01:00 GMT'))
+        self.assertIsNone(parse_accept_datetime('2015-05-01 00:01:00'))
+
+    def test_fallback(self):
+        self.assertEqual(
+            parse_accept_datetime('2015-05-01 00:01:00', fallback=True),
+            datetime(2015, 5, 1, 0, 1, tzinfo=utc)
+        )
+        self.assertEqual(
+            parse_accept_datetime('2015-05-01T02:01:00+02:00', fallback=True),
+            datetime(2015, 5, 1, 0, 1, tzinfo=utc)
+        )
+
+    def test_epoch_microseconds(self):
+        dt = datetime(2015, 5, 1, 0, 1, 2, 345678, tzinfo=utc)
+        self.assertEqual(to_epoch_microseconds(dt), 1430438462345678)
+        self.assertEqual(from_epoch_microseconds(1430438462345678), dt)
@@ -1,6 +1,8 @@
 from views import TimeGateView, MementoDetailView
+from index import IndexedTimeGateView
 
 __all__ = (
     "TimeGateView",
-    "MementoDetailView"
+    "MementoDetailView",
+    "IndexedTimeGateView",
 )
@@ -0,0 +1,444 @@
+import os
+import re
+import mmap
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from itertools import groupby
+from operator import itemgetter
+from django.utils import six
+from memento.dates import to_epoch_microseconds
+from memento.timegate.views import TimeGateView
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+
+# Header: magic, format version, number of URLs, largest primary key
+HEADER = struct.Struct('<8sIIq')
+MAGIC = b'MEMENTOI'
+VERSION = 1
+
+# One record for each URL: hash, position of its first entry, entry count
+URL_RECORD = struct.Struct('<QQQ')
+
+# One entry for each memento: epoch seconds, primary key
+ENTRY = struct.Struct('<qq')
+
+DELTA_RE = re.compile(r'\.delta\.(\d+)$')
+
+
+def get_signature(st):
+    """
+    Returns what identifies a version of a file from its stat result.
+
+    The inode and size are included because a file replaced within the
+    same second can keep its modification time.
+    """
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
+def hash_url(url):
+    """
+    Returns the 64-bit integer the index files the URL under.
+    """
+    if isinstance(url, six.text_type):
+        url = url.encode('utf-8')
+    return struct.unpack('<Q', hashlib.sha1(url).digest()[:8])[0]
+
+
+def to_seconds(dt):
+    """
+    Returns the whole seconds between the epoch and a datetime.
+    """
+    return to_epoch_microseconds(dt) // 10 ** 6
+
+
+def get_segment_paths(path):
+    """
+    Returns the path of the index followed by those of its delta
+    segments, oldest first.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    deltas = []
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if not filename.startswith(name + '.delta.'):
+                continue
+            match = DELTA_RE.search(filename)
+            if match:
+                deltas.append((
+                    int(match.group(1)),
+                    os.path.join(directory, filename)
+                ))
+    return [path] + [p for n, p in sorted(deltas)]
+
+
+class IndexSegment(object):
+    """
+    A single memory-mapped index file.
+
+    It opens with a header, followed by a table with a record for each
+    URL sorted by its hash, followed by each URL's entries sorted by
+    datetime.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.signature = get_signature(os.fstat(f.fileno()))
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.url_count, self.max_pk = HEADER.unpack_from(
+            self.data,
+            0
+        )
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("%s is not a Memento TimeGate index." % path)
+        self.table_offset = HEADER.size
+        self.entry_offset = self.table_offset + (
+            self.url_count * URL_RECORD.size
+        )
+
+    def close(self):
+        self.data.close()
+
+    def find(self, url_hash):
+        """
+        Returns the position of the URL's first entry and the number of
+        entries it has, or None if the URL is not in the segment.
+        """
+        low, high = 0, self.url_count
+        while low < high:
+            mid = (low + high) // 2
+            record_hash, start, count = URL_RECORD.unpack_from(
+                self.data,
+                self.table_offset + mid * URL_RECORD.size
+            )
+            if record_hash < url_hash:
+                low = mid + 1
+            elif record_hash > url_hash:
+                high = mid
+            else:
+                return start, count
+        return None
+
+    def entry(self, position):
+        return ENTRY.unpack_from(
+            self.data,
+            self.entry_offset + position * ENTRY.size
+        )
+
+    def bisect(self, start, count, seconds):
+        """
+        Returns how many of the URL's entries are at or before the seconds.
+        """
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if self.entry(start + mid)[0] <= seconds:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def previous(self, url_hash, seconds):
+        """
+        Returns the last (seconds, pk) entry for the URL at or before the
+        seconds, or None if there isn't one.
+        """
+        found = self.find(url_hash)
+        if found is None:
+            return None
+        start, count = found
+        i = self.bisect(start, count, seconds)
+        if i == 0:
+            return None
+        return self.entry(start + i - 1)
+
+    def next(self, url_hash, seconds):
+        """
+        Returns the first (seconds, pk) entry for the URL at or after the
+        seconds, or None if there isn't one.
+        """
+        found = self.find(url_hash)
+        if found is None:
+            return None
+        start, count = found
+        i = self.bisect(start, count, seconds - 1)
+        if i == count:
+            return None
+        return self.entry(start + i)
+
+    def latest(self, url_hash):
+        found = self.find(url_hash)
+        if found is None or not found[1]:
+            return None
+        start, count = found
+        return self.entry(start + count - 1)
+
+
+class TimeGateIndex(object):
+    """
+    Resolves TimeGate requests from an index file and its delta segments.
+
+    The files are memory-mapped read-only, so every process on a server
+    shares the same pages. New delta segments or a rebuilt index are
+    picked up within refresh_interval seconds.
+    """
+    refresh_interval = 5
+
+    def __init__(self, path):
+        self.path = path
+        self.segments = []
+        self.checked = 0
+        self.lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        now = time.time()
+        if not force and now - self.checked < self.refresh_interval:
+            return
+        with self.lock:
+            self.checked = now
+            current = dict((s.path, s) for s in self.segments)
+            segments = []
+            for path in get_segment_paths(self.path):
+                try:
+                    signature = get_signature(os.stat(path))
+                    segment = current.get(path)
+                    if segment is None or segment.signature != signature:
+                        segment = IndexSegment(path)
+                except (OSError, IOError, ValueError, struct.error):
+                    # Missing, removed by a rebuild since it was listed,
+                    # or not an index
+                    continue
+                segments.append(segment)
+            self.segments = segments
+            # Mappings still in use by another thread are released when
+            # they are garbage collected.
+
+    def __bool__(self):
+        self.refresh()
+        return bool(self.segments)
+    __nonzero__ = __bool__
+
+    def contains(self, url):
+        url_hash = hash_url(url)
+        return any(s.find(url_hash) for s in self.segments)
+
+    def get_nearest_pk(self, url, dt):
+        """
+        Returns the primary key of the memento for the URL nearest to the
+        datetime, preferring the earlier one on a tie, or None if there
+        is no memento at or before the datetime.
+        """
+        self.refresh()
+        url_hash = hash_url(url)
+        seconds = to_seconds(dt)
+        previous = [s.previous(url_hash, seconds) for s in self.segments]
+        previous = [e for e in previous if e is not None]
+        if not previous:
+            return None
+        prev_seconds, prev_pk = max(previous)
+        if prev_seconds == seconds:
+            return prev_pk
+        following = [s.next(url_hash, seconds) for s in self.segments]
+        following = [e for e in following if e is not None]
+        if not following:
+            return prev_pk
+        next_seconds, next_pk = min(following)
+        if seconds - prev_seconds <= next_seconds - seconds:
+            return prev_pk
+        return next_pk
+
+    def get_latest_pk(self, url):
+        """
+        Returns the primary key of the URL's most recent memento, or None.
+        """
+        self.refresh()
+        url_hash = hash_url(url)
+        entries = [s.latest(url_hash) for s in self.segments]
+        entries = [e for e in entries if e is not None]
+        return max(entries)[1] if entries else None
+
+    @property
+    def max_pk(self):
+        self.refresh()
+        return max([s.max_pk for s in self.segments] or [0])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path):
+    """
+    Returns the process's TimeGateIndex for the path, opening it if needed.
+    """
+    try:
+        return _indexes[path]
+    except KeyError:
+        pass
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = TimeGateIndex(path)
+        return _indexes[path]
+
+
+def read_entries(spool, start, count):
+    """
+    Returns the count entries spooled at the position.
+    """
+    spool.seek(start * ENTRY.size)
+    data = spool.read(count * ENTRY.size)
+    return [ENTRY.unpack_from(data, i * ENTRY.size) for i in range(count)]
+
+
+def copy_entries(spool, f, start, count):
+    """
+    Copies the count entries spooled at the position to the file.
+    """
+    spool.seek(start * ENTRY.size)
+    remaining = count * ENTRY.size
+    while remaining:
+        chunk = spool.read(min(remaining, 1 << 20))
+        f.write(chunk)
+        remaining -= len(chunk)
+
+
+def write_index(path, rows):
+    """
+    Writes an index file from (url, datetime, pk) rows sorted by URL and
+    then datetime, and returns the number of mementos written.
+
+    The entries are spooled to a temporary file so only the table of
+    URLs is held in memory, and the finished index is moved into place
+    atomically.
+
+    A URL's rows may arrive in more than one run, for instance when a
+    case-insensitive collation interleaves URLs that differ only in case,
+    so the runs that share a hash are merged into a single record.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    runs = []
+    written = 0
+    max_pk = 0
+    last_url = None
+    tmp_path = None
+    spool = tempfile.TemporaryFile(dir=directory)
+    try:
+        for url, dt, pk in rows:
+            if url is None or dt is None:
+                continue
+            if not isinstance(pk, six.integer_types):
+                raise ValueError(
+                    "The TimeGate index requires integer primary keys."
+                )
+            if url != last_url:
+                runs.append([hash_url(url), written, 0])
+                last_url = url
+            spool.write(ENTRY.pack(to_seconds(dt), pk))
+            runs[-1][2] += 1
+            written += 1
+            max_pk = max(max_pk, pk)
+        runs.sort()
+
+        records = []
+        groups = []
+        position = 0
+        for url_hash, group in groupby(runs, key=itemgetter(0)):
+            group = list(group)
+            count = sum(run[2] for run in group)
+            records.append((url_hash, position, count))
+            groups.append(group)
+            position += count
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(records), max_pk))
+            for record in records:
+                f.write(URL_RECORD.pack(*record))
+            for group in groups:
+                if len(group) == 1:
+                    copy_entries(spool, f, group[0][1], group[0][2])
+                    continue
+                entries = []
+                for url_hash, start, count in group:
+                    entries.extend(read_entries(spool, start, count))
+                entries.sort()
+                for entry in entries:
+                    f.write(ENTRY.pack(*entry))
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+        tmp_path = None
+    finally:
+        spool.close()
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return written
+
+
+class IndexedTimeGateView(TimeGateView):
+    """
+    A TimeGateView that finds the nearest memento in an index file built
+    by the memento_build_index management command rather than by
+    querying the database. Only the chosen memento is fetched, by its
+    primary key.
+
+    Datetimes in the index are kept to the second. URLs missing from the
+    index, for instance those first archived since it was last built,
+    are looked up in the database unless index_fallback is False.
+    """
+    index_path = None
+    index_fallback = True
+
+    def get_index(self):
+        """
+        Returns the TimeGateIndex, or None if the file doesn't exist yet.
+        """
+        if not self.index_path:
+            raise ImproperlyConfigured(
+                "%s is missing an index_path." % self.__class__.__name__
+            )
+        index = get_index(self.index_path)
+        return index if index else None
+
+    def get_indexed_object(self, url, pk):
+        """
+        Returns the object with the primary key, or None if it is gone.
+
+        The URL is checked too, since the index only holds a hash of it
+        and the row may have been edited since the index was built.
+        """
+        try:
+            return self.get_queryset().filter(
+                **{self.url_field: url}
+            ).get(pk=pk)
+        except ObjectDoesNotExist:
+            return None
+
+    def get_object(self, url, dt):
+        index = self.get_index()
+        if index is not None:
+            pk = index.get_nearest_pk(url, dt)
+            if pk is not None:
+                obj = self.get_indexed_object(url, pk)
+                if obj is not None:
+                    return obj
+            elif index.contains(url) or not self.index_fallback:
+                raise self.get_not_found()
+        return super(IndexedTimeGateView, self).get_object(url, dt)
+
+    def get_most_recent_object(self, url):
+        index = self.get_index()
+        if index is not None:
+            pk = index.get_latest_pk(url)
+            if pk is not None:
+                obj = self.get_indexed_object(url, pk)
+                if obj is not None:
+                    return obj
+            elif not self.index_fallback:
+                raise self.get_not_found()
+        return super(IndexedTimeGateView, self).get_most_recent_object(url)
@@ -0,0 +1,115 @@
+import urllib
+from django.conf import settings
+from django.utils.http import RFC3986_SUBDELIMS, urlquote
+from django.contrib.syndication.views import add_domain
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.urlresolvers import (
+    reverse,
+    get_urlconf,
+    NoReverseMatch,
+    get_script_prefix
+)
+
+# A token that survives reversal unquoted so it can be split on afterwards
+URL_PLACEHOLDER = 'MEMENTOORIGINALURL'
+
+# The characters Django's reverse() leaves unquoted in a path
+URL_SAFE_CHARS = RFC3986_SUBDELIMS + str('/~:@')
+
+url_templates = {}
+
+
+def get_url_template(pattern_name):
+    """
+    Returns the path the URL pattern reverses to, split into a prefix and
+    suffix around its url argument, followed by the same two parts with
+    their %-escapes decoded.
+
+    Returns None if the pattern will not reverse with a placeholder, in
+    which case callers should reverse it for each URL.
+    """
+    key = (
+        get_urlconf() or settings.ROOT_URLCONF,
+        get_script_prefix(),
+        pattern_name
+    )
+    try:
+        return url_templates[key]
+    except KeyError:
+        pass
+    try:
+        path = reverse(pattern_name, kwargs={'url': URL_PLACEHOLDER})
+    except NoReverseMatch:
+        template = None
+    else:
+        prefix, sep, suffix = path.partition(URL_PLACEHOLDER)
+        if sep and URL_PLACEHOLDER not in suffix:
+            template = (
+                prefix,
+                suffix,
+                urllib.unquote(prefix),
+                urllib.unquote(suffix),
+            )
+        else:
+            template = None
+    url_templates[key] = template
+    return template
+
+
+class LinkHeaderBuilder(object):
+    """
+    Builds the Memento URLs and Link header for a single request.
+
+    The current site and scheme are resolved once when it is created and
+    the reversed URL patterns are cached for the life of the process.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.domain = get_current_site(request).domain
+        self.is_secure = request.is_secure()
+        self.root = add_domain(self.domain, '', self.is_secure)
+        self.unquoted_root = urllib.unquote(self.root)
+
+    def add_domain(self, url):
+        """
+        Returns the URL with the current site's scheme and domain.
+        """
+        return add_domain(self.domain, url, self.is_secure)
+
+    def get_url(self, pattern_name, url):
+        """
+        Returns the absolute, quoted location of the URL pattern
+        reversed for the provided original URL.
+        """
+        template = get_url_template(pattern_name)
+        if template is None:
+            return self.add_domain(reverse(pattern_name, kwargs={'url': url}))
+        prefix, suffix = template[:2]
+        return self.root + prefix + urlquote(url, URL_SAFE_CHARS) + suffix
+
+    def get_unquoted_url(self, pattern_name, url):
+        """
+        Returns the absolute location of the URL pattern reversed for the
+        provided original URL, with its %-escapes decoded.
+        """
+        template = get_url_template(pattern_name)
+        if template is None:
+            return urllib.unquote(self.get_url(pattern_name, url))
+        prefix, suffix = template[2:]
+        return self.unquoted_root + prefix + url + suffix
+
+    def link_header(self, original_url, timemap_url=None, timegate_url=None):
+        """
+        Returns a Link header value pointing to the original resource and,
+        when their unquoted locations are provided, its TimeMap and
+        TimeGate.
+        """
+        links = ['<%s>; rel="original"' % urllib.unquote(original_url)]
+        if timemap_url:
+            links.append(
+                '<%s>; rel="timemap"; type="application/link-format"' %
+                timemap_url
+            )
+        if timegate_url:
+            links.append('<%s>; rel="timegate"' % timegate_url)
+        return ", ".join(links)
@@ -1,18 +1,114 @@
 import urllib
-from django.core.urlresolvers import reverse
+from memento import metrics
 from django.http import HttpResponse, Http404
-from dateutil.parser import parse as dateparser
+from memento.dates import parse_accept_datetime, to_db, to_utc
 from django.utils.cache import patch_vary_headers
 from django.utils.translation import ugettext as _
 from django.core.exceptions import SuspiciousOperation
 from memento.templatetags.memento_tags import httpdate
 from django.core.exceptions import ImproperlyConfigured
-from django.contrib.syndication.views import add_domain
 from django.views.generic import RedirectView, DetailView
-from django.contrib.sites.shortcuts import get_current_site
+from memento.timegate.links import LinkHeaderBuilder
+from memento.partitions import PartitionMixin
+from memento.mixins import MementoRelatedMixin
 
 
-class MementoDetailView(DetailView):
+class LinkHeaderMixin(object):
+    """
+    Builds the absolute Memento URLs and Link header for a view.
+
+    A single LinkHeaderBuilder is created for each request so the current
+    site and scheme are only resolved once.
+    """
+    link_header_builder_class = LinkHeaderBuilder
+    timemap_pattern_name = None
+    timegate_pattern_name = None
+
+    def get_link_header_builder(self, request):
+        """
+        Returns the LinkHeaderBuilder for the current request.
+        """
+        builder = getattr(self, '_link_header_builder', None)
+        if builder is None or builder.request is not request:
+            builder = self.link_header_builder_class(request)
+            self._link_header_builder = builder
+        return builder
+
+    def get_timemap_url(self, request, url):
+        """
+        Returns the location of the TimeMap that lists resources archived
+        for the provided URL.
+        """
+        builder = self.get_link_header_builder(request)
+        return builder.get_url(self.timemap_pattern_name, url)
+
+    def get_timegate_url(self, request, url):
+        """
+        Returns the location of the TimeGate where a datetime
+        can be submitted to find the closest mementos for this resource.
+        """
+        builder = self.get_link_header_builder(request)
+        return builder.get_url(self.timegate_pattern_name, url)
+
+    def get_link_url(self, request, method_name, pattern_name, url):
+        """
+        Returns the unquoted location to list in the Link header.
+
+        The cached URL template is used unless a subclass overrides the
+        get_timemap_url or get_timegate_url hook, in which case its result
+        is used instead.
+        """
+        if getattr(type(self), method_name) != \
+                getattr(LinkHeaderMixin, method_name):
+            return urllib.unquote(getattr(self, method_name)(request, url))
+        builder = self.get_link_header_builder(request)
+        return builder.get_unquoted_url(pattern_name, url)
+
+    def get_link_header(self, request, url, timegate=True):
+        """
+        Returns the Link header that points to the original URL and its
+        TimeMap and TimeGate, when those patterns are configured.
+        """
+        timemap_url = timegate_url = None
+        if self.timemap_pattern_name:
+            timemap_url = self.get_link_url(
+                request,
+                'get_timemap_url',
+                self.timemap_pattern_name,
+                url
+            )
+        if timegate and self.timegate_pattern_name:
+            timegate_url = self.get_link_url(
+                request,
+                'get_timegate_url',
+                self.timegate_pattern_name,
+                url
+            )
+        builder = self.get_link_header_builder(request)
+        return builder.link_header(url, timemap_url, timegate_url)
+
+
+class MetricsMixin(object):
+    """
+    Records metrics for each request to a view when they are enabled.
+    """
+    metrics_name = None
+    request_metrics = metrics.NULL_REQUEST_METRICS
+
+    def get_metrics_name(self):
+        return self.metrics_name or self.__class__.__name__
+
+    def dispatch(self, request, *args, **kwargs):
+        self.request_metrics = metrics.start_request(self.get_metrics_name())
+        return self.request_metrics.track(
+            super(MetricsMixin, self).dispatch,
+            request,
+            *args,
+            **kwargs
+        )
+
+
+class MementoDetailView(MetricsMixin, LinkHeaderMixin, DetailView):
     """
     Extends Django's DetailView to describe an archived resource.
 
@@ -46,38 +142,14 @@ class MementoDetailView(DetailView):
 
     """
     datetime_field = 'datetime'
-    timemap_pattern_name = None
-    timegate_pattern_name = None
-
-    def get_timemap_url(self, request, url):
-        """
-        Returns the location of the TimeMap that lists resources archived
-        for the provided URL.
-        """
-        path = reverse(self.timemap_pattern_name, kwargs={'url': url})
-        current_site = get_current_site(request)
-        return add_domain(
-            current_site.domain,
-            path,
-            request.is_secure(),
-        )
-
-    def get_timegate_url(self, request, url):
-        """
-        Returns the location of the TimeGate where a datetime
-        can be submitted to find the closest mementos for this resource.
-        """
-        path = reverse(self.timegate_pattern_name, kwargs={'url': url})
-        current_site = get_current_site(request)
-        return add_domain(
-            current_site.domain,
-            path,
-            request.is_secure(),
-        )
 
     def get_original_url(self, obj):
         raise NotImplementedError("get_original_url method not implemented")
 
+    def get_object(self, queryset=None):
+        with self.request_metrics.db():
+            return super(MementoDetailView, self).get_object(queryset)
+
     def get(self, request, *args, **kwargs):
         response = super(MementoDetailView, self).get(
             request,
@@ -88,19 +160,12 @@ class MementoDetailView(DetailView):
         response['Memento-Datetime'] = httpdate(dt)
         if self.timemap_pattern_name:
             original_url = self.get_original_url(self.object)
-            timemap_url = self.get_timemap_url(self.request, original_url)
-            timegate_url = self.get_timegate_url(self.request, original_url)
-            response['Link'] = """<%(original_url)s>; rel="original", \
-<%(timemap_url)s>; rel="timemap"; type="application/link-format", \
-<%(timegate_url)s>; rel="timegate\"""" % dict(
-                original_url=urllib.unquote(original_url),
-                timemap_url=urllib.unquote(timemap_url),
-                timegate_url=urllib.unquote(timegate_url),
-            )
+            response['Link'] = self.get_link_header(request, original_url)
         return response
 
 
-class TimeGateView(RedirectView):
+class TimeGateView(MetricsMixin, LinkHeaderMixin, MementoRelatedMixin,
+                   PartitionMixin, RedirectView):
     """
     Creates a TimeGate that handles a request with Memento headers
     and returns a response that redirects to the corresponding
@@ -108,25 +173,27 @@ class TimeGateView(RedirectView):
     """
     model = None
     queryset = None
-    timemap_pattern_name = None
     url_kwarg = 'url'
     url_field = 'url'
     datetime_field = 'datetime'
+    accept_datetime_fallback = False
 
     def parse_datetime(self, request):
         """
         Parses the requested datetime from the request headers
-        and returns it if it exists. Otherwise returns None.
+        and returns it as an aware UTC datetime if it exists.
+        Otherwise returns None.
         """
         # Verify that the Accept-Datetime header is provided
-        if not request.META.get("HTTP_ACCEPT_DATETIME"):
+        header = request.META.get("HTTP_ACCEPT_DATETIME")
+        if not header:
             return None
 
         # Verify that the Accept-Datetime header is valid
-        try:
-            dt = dateparser(request.META.get("HTTP_ACCEPT_DATETIME"))
-        except:
-            dt = None
+        dt = parse_accept_datetime(
+            header,
+            fallback=self.accept_datetime_fallback
+        )
         if not dt:
             raise SuspiciousOperation(
                 _("Bad request (400): Accept-Datetime header is malformed"),
@@ -138,46 +205,103 @@ class TimeGateView(RedirectView):
         Accepts the requested URL and datetime and returns the object
         with the smallest date difference.
         """
-        queryset = self.get_queryset()
-        queryset = queryset.filter(**{self.url_field: url})
-
-        try:
-            prev_obj = queryset.filter(
-                **{"%s__lte" % self.datetime_field: dt}
-            ).order_by("-%s" % self.datetime_field)[0]
-        except IndexError:
-            raise Http404(_("No %(verbose_name)s found matching the query") %
-                          {'verbose_name': queryset.model._meta.verbose_name})
+        # Without USE_TZ the database holds naive values in TIME_ZONE
+        dt = to_utc(dt)
+        lookup_dt = to_db(dt)
 
-        try:
-            next_obj = queryset.filter(
-                **{"%s__gte" % self.datetime_field: dt}
-            ).order_by("%s" % self.datetime_field)[0]
-        except IndexError:
-            next_obj = None
+        prev_obj = self.get_previous_object(url, lookup_dt)
+        if prev_obj is None:
+            raise self.get_not_found()
+        prev_dt = to_utc(getattr(prev_obj, self.datetime_field))
+        if prev_dt == dt:
+            return prev_obj
 
+        next_obj = self.get_next_object(url, lookup_dt)
         if not next_obj:
             return prev_obj
         else:
-            prev_delta = abs(dt - getattr(prev_obj, self.datetime_field))
-            next_delta = abs(dt - getattr(next_obj, self.datetime_field))
+            next_dt = to_utc(getattr(next_obj, self.datetime_field))
+            prev_delta = abs(dt - prev_dt)
+            next_delta = abs(dt - next_dt)
             if prev_delta <= next_delta:
                 return prev_obj
             else:
                 return next_obj
 
+    def get_previous_object(self, url, dt):
+        """
+        Returns the last object archived for the URL at or before the
+        datetime, or None if there isn't one.
+        """
+        for queryset in self.get_url_querysets(url, dt, backward=True):
+            obj = queryset.filter(
+                **{"%s__lte" % self.datetime_field: dt}
+            ).order_by("-%s" % self.datetime_field).first()
+            if obj is not None:
+                return obj
+        return None
+
+    def get_next_object(self, url, dt):
+        """
+        Returns the first object archived for the URL at or after the
+        datetime, or None if there isn't one.
+        """
+        for queryset in self.get_url_querysets(url, dt):
+            obj = queryset.filter(
+                **{"%s__gte" % self.datetime_field: dt}
+            ).order_by("%s" % self.datetime_field).first()
+            if obj is not None:
+                return obj
+        return None
+
     def get_most_recent_object(self, url):
         """
         Returns the most recently archive object of the submitted URL
         """
+        for queryset in self.get_url_querysets(url):
+            obj = queryset.order_by("-%s" % self.datetime_field).first()
+            if obj is not None:
+                return obj
+        raise self.get_not_found()
+
+    def get_not_found(self):
+        return Http404(_("No %(verbose_name)s found matching the query") % {
+            'verbose_name': self.get_queryset().model._meta.verbose_name
+        })
+
+    def get_url_querysets(self, url, dt=None, backward=False):
+        """
+        Yields the querysets to search for objects archived for the URL.
+
+        Without partitions that is just the view's queryset. Otherwise it
+        is one queryset for each partition, starting with the one that
+        contains the datetime and moving forward, or backward, in time.
+        If no datetime is provided the partitions are walked from the
+        most recent.
+        """
         queryset = self.get_queryset()
-        try:
-            return queryset.filter(**{
-                self.url_field: url,
-            }).order_by("-%s" % self.datetime_field)[0]
-        except IndexError:
-            raise Http404(_("No %(verbose_name)s found matching the query") %
-                          {'verbose_name': queryset.model._meta.verbose_name})
+        if not self.partitions:
+            yield queryset.filter(**{self.url_field: url})
+            return
+        partition_map = self.get_partition_map()
+        if dt is None:
+            partitions = reversed(partition_map)
+        elif backward:
+            partitions = partition_map.before(dt)
+        else:
+            partitions = partition_map.after(dt)
+        for partition in partitions:
+            partition_queryset = partition.get_queryset(queryset)
+            if partition.queryset is not None:
+                partition_queryset = self.apply_memento_related(
+                    partition_queryset,
+                    prefetch=False
+                )
+            partition_queryset = partition.filter(
+                partition_queryset,
+                self.datetime_field
+            )
+            yield partition_queryset.filter(**{self.url_field: url})
 
     def get_queryset(self):
         """
@@ -187,7 +311,7 @@ class TimeGateView(RedirectView):
         """
         if self.queryset is None:
             if self.model:
-                return self.model._default_manager.all()
+                queryset = self.model._default_manager.all()
             else:
                 raise ImproperlyConfigured(
                     "%(cls)s is missing a QuerySet. Define "
@@ -196,31 +320,17 @@ class TimeGateView(RedirectView):
                         'cls': self.__class__.__name__
                     }
                 )
-        return self.queryset.all()
+        else:
+            queryset = self.queryset.all()
+        # The prefetch only runs for the object redirected to, in get()
+        return self.apply_memento_related(queryset, prefetch=False)
 
     def get_redirect_url(self, request, obj):
         """
         Returns the URL that will redirect to the Memento resource.
         """
-        current_site = get_current_site(request)
-        return add_domain(
-            current_site.domain,
-            obj.get_absolute_url(),
-            request.is_secure(),
-        )
-
-    def get_timemap_url(self, request, url):
-        """
-        Returns the location of the TimeMap that lists resources archived
-        for the provided URL.
-        """
-        path = reverse(self.timemap_pattern_name, kwargs={'url': url})
-        current_site = get_current_site(request)
-        return add_domain(
-            current_site.domain,
-            path,
-            request.is_secure(),
-        )
+        builder = self.get_link_header_builder(request)
+        return builder.add_domain(obj.get_absolute_url())
 
     def get(self, request, *args, **kwargs):
         url = self.kwargs.get(self.url_kwarg)
@@ -232,18 +342,20 @@ class TimeGateView(RedirectView):
         url = url.replace("http:/", "http://")
         url = url.replace("http:///", "http://")
         dt = self.parse_datetime(request)
-        if dt:
-            obj = self.get_object(url, dt)
-        else:
-            obj = self.get_most_recent_object(url)
+        with self.request_metrics.db():
+            if dt:
+                obj = self.get_object(url, dt)
+            else:
+                obj = self.get_most_recent_object(url)
+            self.prefetch_memento_related([obj])
         redirect_url = self.get_redirect_url(request, obj)
         response = HttpResponse(status=302)
         patch_vary_headers(response, ["accept-datetime"])
         if self.timemap_pattern_name:
-            response['Link'] = """<%(url)s>; rel="original", \
-<%(timemap_url)s>; rel="timemap"; type="application/link-format\"""" % dict(
-                url=urllib.unquote(url),
-                timemap_url=urllib.unquote(self.get_timemap_url(request, url))
+            response['Link'] = self.get_link_header(
+                request,
+                url,
+                timegate=False
             )
         response['Location'] = urllib.unquote(redirect_url)
         return response
@@ -1,33 +1,99 @@
+from datetime import datetime
+from memento import metrics
 from django.utils import six
+from django.db.models import Max
+from memento.dates import (
+    to_db,
+    to_epoch_microseconds,
+    from_epoch_microseconds
+)
+from memento.partitions import PartitionMixin, PartitionedList
+from memento.mixins import MementoRelatedMixin
 from django.templatetags.tz import utc
 from django.utils.timezone import is_naive
+from django.utils.http import urlencode
 from django.http import Http404, HttpResponse
 from django.core.paginator import InvalidPage, Paginator
 from django.contrib.syndication.views import add_domain
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    ObjectDoesNotExist,
+    SuspiciousOperation
+)
 from .feedgenerator import TimemapLinkListGenerator, TimemapLinkIndexGenerator
+from .dump import TimemapDump
 
+__all__ = (
+    "TimemapLinkList",
+    "TimemapDump",
+)
 
-class TimemapLinkList(object):
+
+class TimemapLinkList(MementoRelatedMixin, PartitionMixin):
     """
     A feed class that returns a list in Memento's Timemap format.
     """
     paginator_class = Paginator
     paginate_by = None
     page_kwarg = 'page'
+    since_field = None
+    since_kwarg = 'since'
+    since_header = 'X-Memento-Since'
+    metrics_name = None
+    datetime_field = 'datetime'
 
     def __call__(self, request, *args, **kwargs):
+        # One instance serves every request, so the metrics are passed along
+        request_metrics = metrics.start_request(self.get_metrics_name())
+        return request_metrics.track(
+            self.get_response,
+            request,
+            request_metrics,
+            *args,
+            **kwargs
+        )
+
+    def get_metrics_name(self):
+        return self.metrics_name or self.__class__.__name__
+
+    def get_response(self, request, request_metrics, *args, **kwargs):
         try:
-            obj = self.get_object(request, *args, **kwargs)
+            with request_metrics.db():
+                obj = self.get_object(request, *args, **kwargs)
         except ObjectDoesNotExist:
             raise Http404('Feed object does not exist.')
         self.request = request
         self.current_site = get_current_site(request)
-        self.queryset = self.__get_dynamic_attr('memento_list', obj)
-        feedgen = self.get_feed(obj)
+        if self.partitions:
+            self.queryset = PartitionedList(
+                self.apply_memento_related(
+                    self.memento_partition_list(obj, partition)
+                )
+                for partition in self.get_partition_map()
+            )
+        else:
+            self.queryset = self.apply_memento_related(
+                self.__get_dynamic_attr('memento_list', obj)
+            )
+        self.since = None
+        since_token = None
+        if self.since_field:
+            self.check_since_field()
+            self.since = self.get_since()
+            if self.since is not None:
+                self.queryset = self.queryset.filter(**{
+                    "%s__gt" % self.since_field: self.since
+                })
+            # The token covers every page, so a single page doesn't get one
+            if not (self.paginate_by and self.get_page_number()):
+                with request_metrics.db():
+                    since_token = self.get_since_token()
+        feedgen = self.get_feed(obj, request_metrics)
         response = HttpResponse(content_type=feedgen.mime_type)
         feedgen.write(response, 'utf-8')
+        if since_token is not None:
+            response[self.since_header] = since_token
         return response
 
     def __get_dynamic_attr(self, attname, obj, default=None):
@@ -46,6 +112,28 @@ class TimemapLinkList(object):
                 return attr()
         return attr
 
+    def memento_partition_list(self, obj, partition):
+        """
+        Returns the mementos for the object that fall in the partition,
+        in the order they were archived.
+
+        Override this if partitions provide their own model or queryset,
+        since the filters applied by memento_list can't be moved to them.
+        """
+        if partition.queryset is not None:
+            raise ImproperlyConfigured(
+                'Define a memento_partition_list() method in your %s class '
+                'to read partitions with their own queryset.' % (
+                    self.__class__.__name__
+                )
+            )
+        queryset = self.__get_dynamic_attr('memento_list', obj)
+        queryset = partition.filter(
+            partition.get_queryset(queryset),
+            self.datetime_field
+        )
+        return queryset.order_by(self.datetime_field)
+
     def memento_datetime(self, item):
         raise ImproperlyConfigured('Define an item_datetime() method in \
 your %s class.' % self.__class__.__name__)
@@ -70,6 +158,97 @@ your %s class.' % self.__class__.__name__)
         except ValueError:
             raise Http404("Page can't be converted to an int.")
 
+    def get_since_model_field(self):
+        """
+        Returns the model field named by since_field, which may be 'pk'.
+        """
+        opts = self.queryset.model._meta
+        if self.since_field == 'pk':
+            return opts.pk
+        return opts.get_field(self.since_field)
+
+    def since_is_datetime(self):
+        field = self.get_since_model_field()
+        return field.get_internal_type() == 'DateTimeField'
+
+    def check_since_field(self):
+        """
+        Raises ImproperlyConfigured if the since_field can't be compared
+        across the partitions.
+
+        Partitions read from another database or their own model or
+        queryset may draw their primary keys from separate sequences,
+        so a token made from one partition's keys would skip rows in
+        the others.
+        """
+        if not self.partitions:
+            return
+        if not self.get_since_model_field().primary_key:
+            return
+        for partition in self.get_partition_map():
+            if partition.using or partition.queryset is not None:
+                raise ImproperlyConfigured(
+                    "%s can't use its primary key as the since_field with "
+                    "%r, which is read from a separate database or table. "
+                    "Use a datetime field instead." % (
+                        self.__class__.__name__,
+                        partition
+                    )
+                )
+
+    def encode_since(self, value):
+        """
+        Returns the token for a since_field value. Datetimes are converted
+        to microseconds since the epoch so no precision is lost.
+        """
+        if isinstance(value, datetime):
+            value = to_epoch_microseconds(value)
+        return six.text_type(value)
+
+    def decode_since(self, token):
+        """
+        Returns the since_field value for a token made by encode_since.
+        """
+        value = int(token)
+        if self.since_is_datetime():
+            value = to_db(from_epoch_microseconds(value))
+        return value
+
+    def get_since(self):
+        """
+        Returns the since_field value the client has already synchronized
+        up to, or None if the request does not include one.
+        """
+        token = self.request.GET.get(self.since_kwarg) or None
+        if not token:
+            return None
+        try:
+            return self.decode_since(token)
+        except (ValueError, OverflowError):
+            raise SuspiciousOperation(
+                "Bad request (400): %s can't be converted to a token." % (
+                    self.since_kwarg
+                )
+            )
+
+    def get_since_token(self):
+        """
+        Returns the token a client should send as the since parameter
+        next time to receive only the mementos added after this response.
+        """
+        querysets = getattr(self.queryset, 'querysets', [self.queryset])
+        values = [
+            qs.aggregate(latest=Max(self.since_field))['latest']
+            for qs in querysets
+        ]
+        values = [v for v in values if v is not None]
+        latest = max(values) if values else None
+        if latest is None:
+            latest = self.since
+        if latest is None:
+            return ''
+        return self.encode_since(latest)
+
     def get_paginator(self, queryset):
         return self.paginator_class(queryset, self.paginate_by)
 
@@ -83,7 +262,9 @@ your %s class.' % self.__class__.__name__)
                 'message': str(e)
             })
 
-    def get_list_feed(self, obj, page_number=None):
+    def get_list_feed(self, obj, page_number=None, request_metrics=None):
+        if request_metrics is None:
+            request_metrics = metrics.NULL_REQUEST_METRICS
         feed_type = TimemapLinkListGenerator
         feed = feed_type(
             original_url=self.get_original_url(obj),
@@ -96,8 +277,10 @@ your %s class.' % self.__class__.__name__)
         if page_number:
             page = self.get_page(page_number)
             self.queryset = page.object_list
+        with request_metrics.db():
+            mementos = list(self.queryset)
         item_list = []
-        for item in self.queryset:
+        for item in mementos:
             link = add_domain(
                 self.current_site.domain,
                 self.__get_dynamic_attr('memento_link', item),
@@ -110,18 +293,25 @@ your %s class.' % self.__class__.__name__)
                 link=link,
                 datetime=item_datetime,
             ))
-        if not page_number:
-            item_list[0]['first'] = True
-            item_list[-1]['last'] = True
-        else:
-            if page_number == 1:
-                item_list[0]['first'] = True
+        # A since list only holds the newest mementos, so none are first
+        first = self.since is None
+        if item_list:
+            if not page_number:
+                item_list[0]['first'] = first
+                item_list[-1]['last'] = True
+            elif page_number == 1:
+                item_list[0]['first'] = first
             elif not page.has_next():
                 item_list[-1]['last'] = True
         [feed.add_item(**d) for d in item_list]
+        # The shared null stand-in is left untouched
+        if request_metrics is not metrics.NULL_REQUEST_METRICS:
+            request_metrics.items = len(item_list)
         return feed
 
-    def get_index_feed(self, obj):
+    def get_index_feed(self, obj, request_metrics=None):
+        if request_metrics is None:
+            request_metrics = metrics.NULL_REQUEST_METRICS
         feed_type = TimemapLinkIndexGenerator
         timemap_url = add_domain(
             self.current_site.domain,
@@ -133,18 +323,24 @@ your %s class.' % self.__class__.__name__)
             timemap_url=timemap_url,
         )
         paginator = self.get_paginator(self.queryset)
+        with request_metrics.db():
+            page_range = paginator.page_range
         item_list = []
-        for page in paginator.page_range:
+        query = {}
+        if self.since is not None:
+            query[self.since_kwarg] = self.request.GET[self.since_kwarg]
+        for page in page_range:
+            query[self.page_kwarg] = page
             link = add_domain(
                 self.current_site.domain,
-                "%s?%s=%s" % (timemap_url, self.page_kwarg, page),
+                "%s?%s" % (timemap_url, urlencode(sorted(query.items()))),
                 self.request.is_secure(),
             )
             item_list.append(dict(link=link))
         [feed.add_item(**d) for d in item_list]
         return feed
 
-    def get_feed(self, obj):
+    def get_feed(self, obj, request_metrics=None):
         """
         Returns a feedgenerator.DefaultFeed object, fully populated, for
         this feed. Raises FeedDoesNotExist for invalid parameters.
@@ -152,8 +348,8 @@ your %s class.' % self.__class__.__name__)
         if self.paginate_by:
             page_number = self.get_page_number()
             if page_number:
-                return self.get_list_feed(obj, page_number)
+                return self.get_list_feed(obj, page_number, request_metrics)
             else:
-                return self.get_index_feed(obj)
+                return self.get_index_feed(obj, request_metrics)
         else:
-            return self.get_list_feed(obj)
+            return self.get_list_feed(obj, request_metrics=request_metrics)
@@ -0,0 +1,135 @@
+from memento.dates import to_utc
+from memento.mixins import MementoRelatedMixin
+from django.http import Http404, StreamingHttpResponse
+from django.db.models.constants import LOOKUP_SEP
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.syndication.views import add_domain
+from django.contrib.sites.shortcuts import get_current_site
+from .feedgenerator import TimemapDumpGenerator, TimemapDumpJSONGenerator
+
+
+class TimemapDump(MementoRelatedMixin):
+    """
+    A feed class that streams every memento in the archive.
+
+    Each row includes the original URL, the memento's URL and the datetime
+    it was archived. The archive is read in primary key order in chunks
+    of chunk_size so memory use stays flat however large it grows.
+    """
+    model = None
+    queryset = None
+    url_field = 'url'
+    datetime_field = 'datetime'
+    chunk_size = 2000
+    format_kwarg = 'format'
+    default_format = 'link'
+    generators = {
+        'link': TimemapDumpGenerator,
+        'ndjson': TimemapDumpJSONGenerator,
+    }
+
+    def __call__(self, request, *args, **kwargs):
+        format_name = (
+            request.GET.get(self.format_kwarg) or self.default_format
+        )
+        feedgen = self.get_generator(format_name)
+        current_site = get_current_site(request)
+        items = self.get_items(current_site.domain, request.is_secure())
+        return StreamingHttpResponse(
+            feedgen.iter_lines(items),
+            content_type=feedgen.mime_type
+        )
+
+    def get_generator(self, format_name):
+        try:
+            return self.generators[format_name]()
+        except KeyError:
+            raise Http404("Unknown format '%s'." % format_name)
+
+    def get_queryset(self):
+        """
+        Return the `QuerySet` of every memento to dump.
+        """
+        if self.queryset is None:
+            if self.model:
+                queryset = self.model._default_manager.all()
+            else:
+                raise ImproperlyConfigured(
+                    "%(cls)s is missing a QuerySet. Define "
+                    "%(cls)s.model, %(cls)s.queryset, or override "
+                    "%(cls)s.get_queryset()." % {
+                        'cls': self.__class__.__name__
+                    }
+                )
+        else:
+            queryset = self.queryset.all()
+        # Fetch the object the original URL lives on in the same query
+        related = self.url_field.split(LOOKUP_SEP)[:-1]
+        if related:
+            queryset = queryset.select_related(LOOKUP_SEP.join(related))
+        return self.apply_memento_related(queryset)
+
+    def iter_mementos(self):
+        """
+        Yields every memento in primary key order, reading chunk_size rows
+        at a time so no more than that are held in memory.
+        """
+        queryset = self.get_queryset().order_by('pk')
+        last_pk = None
+        while True:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            # Each chunk is evaluated in full so prefetch_related applies
+            mementos = list(chunk[:self.chunk_size])
+            for memento in mementos:
+                yield memento
+            if len(mementos) < self.chunk_size:
+                break
+            last_pk = mementos[-1].pk
+
+    def memento_original_url(self, memento):
+        """
+        Returns the original URL of a memento by following url_field.
+        """
+        value = memento
+        for name in self.url_field.split(LOOKUP_SEP):
+            value = getattr(value, name)
+        return value
+
+    def memento_link(self, memento):
+        try:
+            return memento.get_absolute_url()
+        except AttributeError:
+            raise ImproperlyConfigured(
+                'Give your %s class a get_absolute_url() method, or define a '
+                'memento_link() method in your TimemapDump class.' % (
+                    memento.__class__.__name__
+                )
+            )
+
+    def memento_datetime(self, memento):
+        return getattr(memento, self.datetime_field)
+
+    def get_items(self, domain, is_secure=False):
+        """
+        Yields a dict with the original URL, absolute memento URL and UTC
+        datetime of every memento.
+        """
+        for memento in self.iter_mementos():
+            yield dict(
+                original_url=self.memento_original_url(memento),
+                link=add_domain(
+                    domain,
+                    self.memento_link(memento),
+                    is_secure,
+                ),
+                datetime=to_utc(self.memento_datetime(memento)),
+            )
+
+    def write(self, outfile, format_name, domain, is_secure=False):
+        """
+        Writes every memento to the file in the provided format.
+        """
+        feedgen = self.get_generator(format_name)
+        feedgen.write(outfile, self.get_items(domain, is_secure))
@@ -1,6 +1,8 @@
+import json
 from django.utils.six import StringIO
 from django.utils.encoding import iri_to_uri
 from django.template.loader import render_to_string
+from memento.templatetags.memento_tags import httpdate
 
 
 class TimemapLinkListGenerator(object):
@@ -33,12 +35,16 @@ class TimemapLinkListGenerator(object):
         """
         Returns the earliest datetime in the item list.
         """
+        if not self.items:
+            return None
         return min([i['datetime'] for i in self.items])
 
     def maximum_datetime(self):
         """
         Returns the latest datetime in the item list.
         """
+        if not self.items:
+            return None
         return max([i['datetime'] for i in self.items])
 
     def get_context(self):
@@ -82,12 +88,16 @@ class TimemapLinkIndexGenerator(TimemapLinkListGenerator):
         """
         Returns the earliest datetime in the item list.
         """
+        if not self.items:
+            return None
         return min([i['minimum_datetime'] for i in self.items])
 
     def maximum_datetime(self):
         """
         Returns the latest datetime in the item list.
         """
+        if not self.items:
+            return None
         return max([i['maximum_datetime'] for i in self.items])
 
     def get_context(self):
@@ -98,3 +108,53 @@ class TimemapLinkIndexGenerator(TimemapLinkListGenerator):
             'maximum_datetime': self.maximum_datetime(),
             'items': self.items,
         }
+
+
+class TimemapDumpGenerator(object):
+    """
+    Base class for streaming every memento in an archive, one per line.
+    """
+    mime_type = 'application/link-format; charset=utf-8'
+
+    def format_item(self, original_url, link, datetime):
+        """
+        Returns the line for a single memento.
+        """
+        return '<%s>; rel="memento"; datetime="%s"; anchor="%s"' % (
+            iri_to_uri(link),
+            httpdate(datetime),
+            iri_to_uri(original_url),
+        )
+
+    def iter_lines(self, items):
+        """
+        Yields each memento as a line of text, including its separator.
+        """
+        separator = ''
+        for item in items:
+            yield separator + self.format_item(**item)
+            separator = ',\n'
+        if separator:
+            yield '\n'
+
+    def write(self, outfile, items):
+        for line in self.iter_lines(items):
+            outfile.write(line)
+
+
+class TimemapDumpJSONGenerator(TimemapDumpGenerator):
+    mime_type = 'application/x-ndjson; charset=utf-8'
+
+    def format_item(self, original_url, link, datetime):
+        """
+        Returns the JSON object for a single memento.
+        """
+        return json.dumps({
+            'original_url': iri_to_uri(original_url),
+            'memento_url': iri_to_uri(link),
+            'datetime': httpdate(datetime),
+        }, sort_keys=True)
+
+    def iter_lines(self, items):
+        for item in items:
+            yield self.format_item(**item) + '\n'